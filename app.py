@@ -3,6 +3,7 @@ import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime
+import json
 import mysql.connector
 from mysql.connector import Error
 
@@ -42,6 +43,137 @@ DB_CONFIG = {
     'database': 'weight_tracker'
 }
 
+# Number of most recent readings covered by the summary moving average
+SUMMARY_WINDOW = 14
+
+# Summarised metrics mapped to the table holding their readings
+SUMMARY_METRICS = {
+    'weight': 'weight_measurements',
+    'systolic': 'blood_pressure_measurements',
+    'diastolic': 'blood_pressure_measurements',
+    'pulse': 'blood_pressure_measurements'
+}
+
+def rebuild_summary(cursor, metric):
+    """Recompute a metric's summary row from its full measurement history"""
+    # Lock the summary row first so concurrent writers queue behind the rebuild
+    cursor.execute("""
+        SELECT metric
+        FROM measurement_summary
+        WHERE metric = %s
+        FOR UPDATE
+    """, (metric,))
+    cursor.fetchall()
+    
+    # Locking read so the rebuild sees the latest committed readings
+    cursor.execute(f"""
+        SELECT measurement_date, {metric}
+        FROM {SUMMARY_METRICS[metric]}
+        WHERE {metric} IS NOT NULL
+        ORDER BY measurement_date, id
+        LOCK IN SHARE MODE
+    """)
+    rows = cursor.fetchall()
+    
+    values = [float(row[1]) for row in rows]
+    window = values[-SUMMARY_WINDOW:]
+    cursor.execute("""
+        UPDATE measurement_summary
+        SET first_value = %s,
+            latest_date = %s,
+            latest_value = %s,
+            reading_count = %s,
+            window_sum = %s,
+            window_values = %s
+        WHERE metric = %s
+    """, (
+        values[0] if values else None,
+        rows[-1][0] if rows else None,
+        values[-1] if values else None,
+        len(values),
+        sum(window),
+        json.dumps(window),
+        metric
+    ))
+
+def lock_summaries(cursor, metrics):
+    """Lock summary rows before inserting a reading.
+    
+    Taking the summary locks ahead of the measurement insert, in primary key
+    order, keeps writers and rebuilds from deadlocking on each other.
+    """
+    placeholders = ', '.join(['%s'] * len(metrics))
+    cursor.execute(f"""
+        SELECT metric
+        FROM measurement_summary
+        WHERE metric IN ({placeholders})
+        ORDER BY metric
+        FOR UPDATE
+    """, tuple(metrics))
+    cursor.fetchall()
+
+def update_summary(cursor, metric, date, value):
+    """Fold a newly inserted reading into the metric's summary row.
+    
+    Must run on the cursor that performed the insert, before commit, so the
+    summary changes in the same transaction as the measurement. value must
+    be what the column stored, i.e. already rounded to the column's scale.
+    """
+    if value is None:
+        return
+    
+    cursor.execute("""
+        SELECT latest_date, window_values
+        FROM measurement_summary
+        WHERE metric = %s
+        FOR UPDATE
+    """, (metric,))
+    
+    row = cursor.fetchone()
+    if row is None or (row[0] is not None and date < row[0]):
+        # Backdated entry: the ordering changed, so rebuild
+        rebuild_summary(cursor, metric)
+        return
+    
+    window = (json.loads(row[1]) + [float(value)])[-SUMMARY_WINDOW:]
+    cursor.execute("""
+        UPDATE measurement_summary
+        SET first_value = COALESCE(first_value, %s),
+            latest_date = %s,
+            latest_value = %s,
+            reading_count = reading_count + 1,
+            window_sum = %s,
+            window_values = %s
+        WHERE metric = %s
+    """, (float(value), date, float(value), sum(window), json.dumps(window), metric))
+
+def get_summaries():
+    """Fetch the summary row of every metric, keyed by metric name"""
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor(dictionary=True)
+        
+        cursor.execute("""
+            SELECT metric, first_value, latest_value, reading_count, window_sum, window_values
+            FROM measurement_summary
+            WHERE reading_count > 0
+        """)
+        
+        summaries = {}
+        for row in cursor.fetchall():
+            row['ma'] = row['window_sum'] / len(json.loads(row['window_values']))
+            summaries[row['metric']] = row
+        return summaries
+        
+    except Error as e:
+        st.error(f"Database Error: {e}")
+        return {}
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
 def init_database():
     """Initialize database and create tables if they don't exist"""
     try:
@@ -71,6 +203,28 @@ def init_database():
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        
+        # Create summary table if it doesn't exist. One row per metric holds
+        # the latest/first reading, the reading count and the last
+        # SUMMARY_WINDOW values, kept current by the add_* functions.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS measurement_summary (
+                metric VARCHAR(32) PRIMARY KEY,
+                first_value DOUBLE,
+                latest_date DATE,
+                latest_value DOUBLE,
+                reading_count INT NOT NULL DEFAULT 0,
+                window_sum DOUBLE NOT NULL DEFAULT 0,
+                window_values TEXT NOT NULL
+            )
+        """)
+        
+        # Seed an empty row per metric so writers always have a row to lock
+        for metric in SUMMARY_METRICS:
+            cursor.execute("""
+                INSERT IGNORE INTO measurement_summary (metric, window_values)
+                VALUES (%s, '[]')
+            """, (metric,))
         conn.commit()
         
     except Error as e:
@@ -83,6 +237,79 @@ def init_database():
             conn.close()
     return True
 
+@st.cache_resource
+def sync_summaries():
+    """Rebuild summary rows that disagree with their measurement tables.
+    
+    Compares the reading count, the first reading, the latest date and the
+    last SUMMARY_WINDOW readings, i.e. everything the dashboard metrics are
+    derived from. Catches readings recorded before the summary table existed
+    or inserted, edited or deleted outside the add_* functions, except edits
+    to readings in the middle of the history, which no metric depends on.
+    Cached so it runs once per server process rather than on every rerun;
+    call sync_summaries.clear() to force a recheck.
+    """
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT metric, reading_count, first_value, latest_date, window_values
+            FROM measurement_summary
+        """)
+        summarised = {
+            row[0]: (row[1], row[2], row[3], json.loads(row[4]))
+            for row in cursor.fetchall()
+        }
+        
+        for metric, table in SUMMARY_METRICS.items():
+            cursor.execute(f"""
+                SELECT COUNT(*)
+                FROM {table}
+                WHERE {metric} IS NOT NULL
+            """)
+            count = cursor.fetchone()[0]
+            
+            cursor.execute(f"""
+                SELECT {metric}
+                FROM {table}
+                WHERE {metric} IS NOT NULL
+                ORDER BY measurement_date, id
+                LIMIT 1
+            """)
+            first = cursor.fetchone()
+            
+            cursor.execute(f"""
+                SELECT measurement_date, {metric}
+                FROM {table}
+                WHERE {metric} IS NOT NULL
+                ORDER BY measurement_date DESC, id DESC
+                LIMIT %s
+            """, (SUMMARY_WINDOW,))
+            rows = cursor.fetchall()
+            window = [float(row[1]) for row in reversed(rows)]
+            
+            expected = (
+                count,
+                float(first[0]) if first else None,
+                rows[0][0] if rows else None,
+                window
+            )
+            if summarised.get(metric) != expected:
+                rebuild_summary(cursor, metric)
+            # Commit per metric so at most one summary row lock is held
+            conn.commit()
+        
+    except Error as e:
+        st.error(f"Database Error: {e}")
+        return False
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+    return True
+
 def get_weight_data():
     """Fetch all weight measurements from database"""
     try:
@@ -92,7 +319,7 @@ def get_weight_data():
         cursor.execute("""
             SELECT measurement_date, weight, notes 
             FROM weight_measurements 
-            ORDER BY measurement_date DESC
+            ORDER BY measurement_date, id
         """)
         
         return cursor.fetchall()
@@ -115,7 +342,7 @@ def get_bp_data():
         cursor.execute("""
             SELECT measurement_date, systolic, diastolic, pulse, notes 
             FROM blood_pressure_measurements 
-            ORDER BY measurement_date DESC
+            ORDER BY measurement_date, id
         """)
         
         return cursor.fetchall()
@@ -135,10 +362,14 @@ def add_weight_measurement(date, weight, notes):
         conn = mysql.connector.connect(**DB_CONFIG)
         cursor = conn.cursor()
         
+        # Round to the column's scale so the summary holds the stored value
+        weight = round(weight, 2)
+        lock_summaries(cursor, ['weight'])
         cursor.execute("""
             INSERT INTO weight_measurements (measurement_date, weight, notes)
             VALUES (%s, %s, %s)
         """, (date, weight, notes))
+        update_summary(cursor, 'weight', date, weight)
         
         conn.commit()
         return True
@@ -158,10 +389,14 @@ def add_bp_measurement(date, systolic, diastolic, pulse, notes):
         conn = mysql.connector.connect(**DB_CONFIG)
         cursor = conn.cursor()
         
+        lock_summaries(cursor, ['systolic', 'diastolic', 'pulse'])
         cursor.execute("""
             INSERT INTO blood_pressure_measurements (measurement_date, systolic, diastolic, pulse, notes)
             VALUES (%s, %s, %s, %s, %s)
         """, (date, systolic, diastolic, pulse, notes))
+        update_summary(cursor, 'systolic', date, systolic)
+        update_summary(cursor, 'diastolic', date, diastolic)
+        update_summary(cursor, 'pulse', date, pulse)
         
         conn.commit()
         return True
@@ -182,10 +417,9 @@ def get_latest_weight():
         cursor = conn.cursor()
         
         cursor.execute("""
-            SELECT weight 
-            FROM weight_measurements 
-            ORDER BY measurement_date DESC 
-            LIMIT 1
+            SELECT latest_value 
+            FROM measurement_summary 
+            WHERE metric = 'weight' AND reading_count > 0
         """)
         
         result = cursor.fetchone()
@@ -207,14 +441,15 @@ def get_latest_bp():
         cursor = conn.cursor()
         
         cursor.execute("""
-            SELECT systolic, diastolic, pulse 
-            FROM blood_pressure_measurements 
-            ORDER BY measurement_date DESC 
-            LIMIT 1
+            SELECT metric, latest_value 
+            FROM measurement_summary 
+            WHERE metric IN ('systolic', 'diastolic', 'pulse') AND reading_count > 0
         """)
         
-        result = cursor.fetchone()
-        return result if result else (120, 80, 70)
+        latest = dict(cursor.fetchall())
+        if 'systolic' not in latest:
+            return (120, 80, 70)
+        return (latest['systolic'], latest['diastolic'], latest.get('pulse', 70))
         
     except Error as e:
         st.error(f"Database Error: {e}")
@@ -225,11 +460,28 @@ def get_latest_bp():
         if 'conn' in locals():
             conn.close()
 
+def summary_or_fallback(summaries, metric, df):
+    """Return a metric's summary row, or compute one from df if it is missing"""
+    if metric in summaries:
+        return summaries[metric]
+    
+    values = df[metric].dropna()
+    if values.empty:
+        return None
+    
+    window = values.iloc[-SUMMARY_WINDOW:]
+    return {
+        'first_value': float(values.iloc[0]),
+        'latest_value': float(values.iloc[-1]),
+        'reading_count': len(values),
+        'ma': float(window.mean())
+    }
+
 def calculate_ma(data, value_column, periods=14):
     """Calculate Simple Moving Average"""
     df = pd.DataFrame(data)
     df['measurement_date'] = pd.to_datetime(df['measurement_date'])
-    df = df.sort_values('measurement_date')
+    df = df.sort_values('measurement_date', kind='mergesort')
     df['ma'] = df[value_column].rolling(window=periods, min_periods=1).mean()
     return df
 
@@ -238,6 +490,10 @@ if not init_database():
     st.error("Failed to initialize database. Please check your database connection.")
     st.stop()
 
+# Re-sync summaries with the measurement tables once per server process
+if not sync_summaries():
+    sync_summaries.clear()
+
 # App title and description
 st.title("🩺 Health Tracker")
 
@@ -321,6 +577,7 @@ with tab2:
 # Get data for visualization
 weight_data = get_weight_data()
 bp_data = get_bp_data()
+summaries = get_summaries()
 
 # Main content area - Combined visualization
 st.header("Health Metrics Dashboard")
@@ -336,7 +593,7 @@ with vis_tab1:
         # Process BP data
         bp_df = pd.DataFrame(bp_data)
         bp_df['measurement_date'] = pd.to_datetime(bp_df['measurement_date'])
-        bp_df = bp_df.sort_values('measurement_date')
+        bp_df = bp_df.sort_values('measurement_date', kind='mergesort')
         bp_df['systolic_ma'] = bp_df['systolic'].rolling(window=14, min_periods=1).mean()
         bp_df['diastolic_ma'] = bp_df['diastolic'].rolling(window=14, min_periods=1).mean()
         
@@ -440,17 +697,20 @@ with vis_tab1:
         st.plotly_chart(fig, use_container_width=True)
         
         # Statistics cards
+        weight_summary = summary_or_fallback(summaries, 'weight', weight_df)
+        systolic_summary = summary_or_fallback(summaries, 'systolic', bp_df)
+        diastolic_summary = summary_or_fallback(summaries, 'diastolic', bp_df)
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("Latest Weight", f"{weight_df['weight'].iloc[-1]:.1f} kg")
+            st.metric("Latest Weight", f"{weight_summary['latest_value']:.1f} kg")
         with col2:
-            st.metric("Latest BP", f"{bp_df['systolic'].iloc[-1]}/{bp_df['diastolic'].iloc[-1]}")
+            st.metric("Latest BP", f"{systolic_summary['latest_value']:.0f}/{diastolic_summary['latest_value']:.0f}")
         with col3:
-            weight_change = weight_df['weight'].iloc[-1] - weight_df['weight'].iloc[0]
+            weight_change = weight_summary['latest_value'] - weight_summary['first_value']
             st.metric("Weight Change", f"{weight_change:.1f} kg")
         with col4:
-            days_tracked = max(len(weight_df), len(bp_df))
+            days_tracked = max(weight_summary['reading_count'], systolic_summary['reading_count'])
             st.metric("Days Tracked", days_tracked)
             
     elif weight_data:
@@ -466,7 +726,8 @@ with vis_tab2:
         df = calculate_ma(weight_data, 'weight')
         
         # Display most recent MA weight prominently at the top
-        latest_ma = df['ma'].iloc[-1]
+        weight_summary = summary_or_fallback(summaries, 'weight', df)
+        latest_ma = weight_summary['ma']
         st.markdown(f"<div style='text-align: center; margin-bottom: 30px;'><h2 style='font-size: 2.5em; font-weight: bold; color: #1E293B; margin: 0;'>Current Weight (14-Day MA): {latest_ma:.1f} kg</h2></div>", unsafe_allow_html=True)
         
         # Create plot
@@ -510,14 +771,14 @@ with vis_tab2:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("Latest Weight", f"{df['weight'].iloc[-1]:.1f} kg")
+            st.metric("Latest Weight", f"{weight_summary['latest_value']:.1f} kg")
         with col2:
-            st.metric("14-Day MA", f"{df['ma'].iloc[-1]:.1f} kg")
+            st.metric("14-Day MA", f"{latest_ma:.1f} kg")
         with col3:
-            total_loss = df['weight'].iloc[-1] - df['weight'].iloc[0]
+            total_loss = weight_summary['latest_value'] - weight_summary['first_value']
             st.metric("Total Change", f"{total_loss:.1f} kg")
         with col4:
-            st.metric("Days Tracked", len(df))
+            st.metric("Days Tracked", weight_summary['reading_count'])
         
         # Data table
         st.header("Weight History")
@@ -533,7 +794,7 @@ with vis_tab3:
         # Process data
         bp_df = pd.DataFrame(bp_data)
         bp_df['measurement_date'] = pd.to_datetime(bp_df['measurement_date'])
-        bp_df = bp_df.sort_values('measurement_date')
+        bp_df = bp_df.sort_values('measurement_date', kind='mergesort')
         bp_df['systolic_ma'] = bp_df['systolic'].rolling(window=14, min_periods=1).mean()
         bp_df['diastolic_ma'] = bp_df['diastolic'].rolling(window=14, min_periods=1).mean()
         bp_df['pulse_ma'] = bp_df['pulse'].rolling(window=14, min_periods=1).mean()
@@ -630,18 +891,24 @@ with vis_tab3:
         st.plotly_chart(fig2, use_container_width=True)
         
         # Statistics
+        systolic_summary = summary_or_fallback(summaries, 'systolic', bp_df)
+        diastolic_summary = summary_or_fallback(summaries, 'diastolic', bp_df)
+        pulse_summary = summary_or_fallback(summaries, 'pulse', bp_df)
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            latest_bp = f"{bp_df['systolic'].iloc[-1]}/{bp_df['diastolic'].iloc[-1]}"
+            latest_bp = f"{systolic_summary['latest_value']:.0f}/{diastolic_summary['latest_value']:.0f}"
             st.metric("Latest BP", latest_bp)
         with col2:
-            latest_ma_bp = f"{bp_df['systolic_ma'].iloc[-1]:.1f}/{bp_df['diastolic_ma'].iloc[-1]:.1f}"
+            latest_ma_bp = f"{systolic_summary['ma']:.1f}/{diastolic_summary['ma']:.1f}"
             st.metric("14-Day MA", latest_ma_bp)
         with col3:
-            st.metric("Latest Pulse", f"{bp_df['pulse'].iloc[-1]} bpm")
+            if pulse_summary:
+                st.metric("Latest Pulse", f"{pulse_summary['latest_value']:.0f} bpm")
+            else:
+                st.metric("Latest Pulse", "—")
         with col4:
-            st.metric("Days Tracked", len(bp_df))
+            st.metric("Days Tracked", systolic_summary['reading_count'])
         
         # Data table
         st.header("Blood Pressure History")